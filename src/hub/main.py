@@ -3,13 +3,15 @@ from pathlib import Path
 
 from textual.app import App, ComposeResult
 from textual.containers import Container, Horizontal
-from textual.widgets import Label
+from textual.widgets import Input, Label
 
 from hub.panels.git_panel import GitPanel
 from hub.panels.terminal_panel import TerminalPanel
 
 
 class HubApp(App):
+    CSS_PATH = "panels/panels.tcss"
+
     CSS = """
     Horizontal {
         height: 100%;
@@ -42,23 +44,20 @@ class HubApp(App):
             yield Container(TerminalPanel(id="terminal-view"), id="right-panel")
 
     def on_mount(self) -> None:
-        self.query_one("#git-view").focus()
+        # Resolve widgets once so keybindings don't re-query the DOM
+        self._git_panel = self.query_one("#git-view", GitPanel)
+        self._terminal_input = self.query_one(TerminalPanel).query_one(Input)
+        self._git_panel.focus()
 
     def action_focus_left(self) -> None:
-        self.query_one("#git-view").focus()
+        self._git_panel.focus()
 
     def action_focus_right(self) -> None:
         # Focus the input inside the Terminal panel
-        terminal_panel = self.query_one(TerminalPanel)
-        terminal_panel.query_one("Input").focus()
+        self._terminal_input.focus()
 
     def action_toggle_git_folder(self) -> None:
-        try:
-            # Only toggle if left panel is focused or we explicitly want to
-            git_panel = self.query_one(GitPanel)
-            git_panel.action_toggle_view()
-        except:
-            pass
+        self._git_panel.action_toggle_view()
 
 
 def main():
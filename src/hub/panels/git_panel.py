@@ -1,11 +1,20 @@
+import asyncio
+from collections.abc import Iterable
 from pathlib import Path
 from typing import Optional
 
 from git import Repo, InvalidGitRepositoryError
+from git.diff import Diff
+from textual import on, work
 from textual.app import ComposeResult
-from textual.containers import Vertical
 from textual.reactive import reactive
 from textual.widgets import Static, Label, ListItem, ListView
+from textual.worker import Worker, WorkerState
+
+# (branch, staged, changed, untracked)
+GitStatus = tuple[str, list[str], list[str], list[str]]
+# (text, classes) of a single line in the content list
+Row = tuple[str, str]
 
 
 class GitPanel(Static):
@@ -13,43 +22,9 @@ class GitPanel(Static):
     A panel that displays Git status or a folder browser.
     """
 
-    DEFAULT_CSS = """
-    GitPanel {
-        height: 100%;
-        background: $surface;
-        border: solid grey; /* Use grey for grey/dimmed look */
-    }
-    
-    /* When focused, change border to white (or bright primary) */
-    GitPanel:focus {
-        border: solid white; /* Use white for focused state */
-    }
-    
-    .header {
-        text-align: center;
-        text-style: bold;
-        padding: 1;
-        background: $primary;
-        color: $text;
-    }
-
-    .section-title {
-        color: $text-muted;
-        padding-top: 1;
-        padding-left: 1;
-    }
-
-    .status-item {
-        padding-left: 2;
-    }
-
-    .mode-indicator {
-        dock: bottom;
-        text-align: center;
-        background: $accent;
-        color: $text;
-    }
-    """
+    BINDINGS = [
+        ("r", "refresh", "Refresh"),
+    ]
 
     mode = reactive("git")
 
@@ -58,51 +33,115 @@ class GitPanel(Static):
         self.repo_path = repo_path
         self.repo: Optional[Repo] = None
         self.can_focus = True
-        try:
-            self.repo = Repo(str(repo_path))
-        except InvalidGitRepositoryError:
-            self.repo = None
+        # Valid for as long as .git/index is unchanged
+        self._status_cache: Optional[GitStatus] = None
+        self._index_mtime = 0
+        # Rows currently mounted in #content, in display order
+        self._rendered_rows: list[Row] = []
+        self._update_lock = asyncio.Lock()
+        # Set once load_repo has finished, whether or not a repo was found
+        self._repo_loaded = False
 
     def compose(self) -> ComposeResult:
         yield Label("", id="header", classes="header")
-        yield Vertical(id="content")
-        yield Label("Press 't' to toggle view", classes="mode-indicator")
-
-    def on_mount(self) -> None:
-        self.update_view()
-
-    def watch_mode(self, mode: str) -> None:
-        self.update_view()
-
-    def update_view(self) -> None:
-        header = self.query_one("#header", Label)
-        content = self.query_one("#content", Vertical)
-
-        # Clear existing content
-        content.remove_children()
+        content = ListView(id="content")
+        content.can_focus = False  # Keep focus on the panel itself
+        yield content
+        yield Label(
+            "Press 't' to toggle view, 'r' to refresh", classes="mode-indicator"
+        )
+
+    @on(ListView.Highlighted, "#content")
+    def _clear_highlight(self, event: ListView.Highlighted) -> None:
+        # The list is display-only; drop the cursor a mouse click leaves behind
+        event.list_view.index = None
+
+    async def on_mount(self) -> None:
+        await self.update_view()
+        self.load_repo()
+
+    @work(thread=True)
+    def load_repo(self) -> None:
+        """Open the repository off the event loop; it can be slow on large repos."""
+        try:
+            self.repo = Repo(str(self.repo_path))
+        except InvalidGitRepositoryError:
+            self.repo = None
+        self._repo_loaded = True
+
+    async def on_worker_state_changed(self, event: Worker.StateChanged) -> None:
+        # Show the repository once load_repo is done; the message is only
+        # delivered while the panel is still mounted
+        if event.worker.name == "load_repo" and event.state == WorkerState.SUCCESS:
+            await self.update_view()
+
+    async def watch_mode(self, mode: str) -> None:
+        await self.update_view()
+
+    async def update_view(self) -> None:
+        # Serialize updates so overlapping calls can't interleave their diffs
+        async with self._update_lock:
+            header = self.query_one("#header", Label)
+
+            if self.mode == "git":
+                rows = self._render_git_status(header)
+            else:
+                rows = self._render_folder_browser(header)
+
+            await self._sync_rows(rows)
+
+    async def _sync_rows(self, rows: list[Row]) -> None:
+        """Update the content list in place, mounting and removing only the delta."""
+        content = self.query_one("#content", ListView)
+
+        wanted = set(rows)
+        stale = [i for i, row in enumerate(self._rendered_rows) if row not in wanted]
+        if stale:
+            await content.remove_items(stale)
+            self._rendered_rows = [row for row in self._rendered_rows if row in wanted]
+
+        # Rows only ever get inserted, so fall back to a rebuild if the
+        # surviving rows changed their relative order
+        rendered = set(self._rendered_rows)
+        if [row for row in rows if row in rendered] != self._rendered_rows:
+            await content.clear()
+            self._rendered_rows = []
+            rendered = set()
+
+        index = 0
+        while index < len(rows):
+            if (
+                index < len(self._rendered_rows)
+                and self._rendered_rows[index] == rows[index]
+            ):
+                index += 1
+                continue
+
+            # Mount each run of consecutive new rows in a single call
+            end = index
+            while end < len(rows) and rows[end] not in rendered:
+                end += 1
+            new_rows = rows[index:end]
+            await content.insert(
+                index,
+                [ListItem(Label(text, classes=classes)) for text, classes in new_rows],
+            )
+            self._rendered_rows[index:index] = new_rows
+            index = end
 
-        if self.mode == "git":
-            self._render_git_status(header, content)
-        else:
-            self._render_folder_browser(header, content)
+    def _render_git_status(self, header: Label) -> list[Row]:
+        if not self._repo_loaded:
+            header.update("Git Status")
+            return [("Loading...", "status-item")]
 
-    def _render_git_status(self, header: Label, content: Vertical) -> None:
         if not self.repo:
             header.update("Git Status")
-            content.mount(Label("Not a git repository", classes="status-item"))
-            return
+            return [("Not a git repository", "status-item")]
 
         try:
-            # Get current branch
-            try:
-                branch_name = self.repo.active_branch.name
-            except TypeError:
-                branch_name = "DETACHED HEAD"
-
-            # Get changes
-            changed_files = [item.a_path for item in self.repo.index.diff(None)]
-            staged_files = [item.a_path for item in self.repo.index.diff("HEAD")]
-            untracked_files = self.repo.untracked_files
+            branch_name, staged_files, changed_files, untracked_files = (
+                self._get_git_status(self.repo)
+            )
 
             total_changes = (
                 len(changed_files) + len(staged_files) + len(untracked_files)
@@ -111,31 +150,69 @@ class GitPanel(Static):
             header.update(f"Git: {branch_name} ({total_changes})")
 
             if total_changes == 0:
-                content.mount(Label("No changes", classes="status-item"))
-                return
+                return [("No changes", "status-item")]
+
+            rows: list[Row] = []
 
             if staged_files:
-                content.mount(Label("Staged:", classes="section-title"))
-                for file in staged_files:
-                    content.mount(Label(f"A {file}", classes="status-item"))
+                rows.append(("Staged:", "section-title"))
+                rows.extend((f"A {file}", "status-item") for file in staged_files)
 
             if changed_files:
-                content.mount(Label("Modified:", classes="section-title"))
-                for file in changed_files:
-                    content.mount(Label(f"M {file}", classes="status-item"))
+                rows.append(("Modified:", "section-title"))
+                rows.extend((f"M {file}", "status-item") for file in changed_files)
 
             if untracked_files:
-                content.mount(Label("Untracked:", classes="section-title"))
-                for file in untracked_files:
-                    content.mount(Label(f"? {file}", classes="status-item"))
+                rows.append(("Untracked:", "section-title"))
+                rows.extend((f"? {file}", "status-item") for file in untracked_files)
+
+            return rows
 
         except Exception as e:
             header.update("Git Status (Error)")
-            content.mount(Label(str(e), classes="status-item"))
+            return [(str(e), "status-item")]
+
+    def _get_git_status(self, repo: Repo) -> GitStatus:
+        """Return the cached git status, rescanning only if the index changed."""
+        index_path = Path(repo.git_dir) / "index"
+        try:
+            index_mtime = index_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            index_mtime = 0
+
+        status = self._status_cache
+        if status is None or index_mtime != self._index_mtime:
+            # Get current branch
+            try:
+                branch_name = repo.active_branch.name
+            except TypeError:
+                branch_name = "DETACHED HEAD"
+
+            # Get changes
+            changed_files = self._diff_paths(repo.index.diff(None))
+            staged_files = self._diff_paths(repo.index.diff("HEAD"))
+            untracked_files = repo.untracked_files
 
-    def _render_folder_browser(self, header: Label, content: Vertical) -> None:
+            status = (branch_name, staged_files, changed_files, untracked_files)
+            self._status_cache = status
+            self._index_mtime = index_mtime
+
+        return status
+
+    @staticmethod
+    def _diff_paths(diffs: Iterable[Diff]) -> list[str]:
+        """Return the path of each diff entry, falling back to its other side."""
+        paths = (item.a_path or item.b_path for item in diffs)
+        return [path for path in paths if path is not None]
+
+    def _render_folder_browser(self, header: Label) -> list[Row]:
         header.update("Folder Browser")
-        content.mount(Label("Folder Browser - Coming soon", classes="status-item"))
+        return [("Folder Browser - Coming soon", "status-item")]
 
     def action_toggle_view(self) -> None:
         self.mode = "folder" if self.mode == "git" else "git"
+
+    async def action_refresh(self) -> None:
+        """Drop the cached git status and rescan the repository."""
+        self._status_cache = None
+        await self.update_view()
@@ -1,99 +1,173 @@
 import asyncio
+import codecs
+import fcntl
 import os
 import shlex
-from typing import Optional
-
-from textual import on, work
+import signal
+import sys
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from rich.markup import escape
+from rich.text import Text
+from textual import on
 from textual.app import ComposeResult
+from textual.timer import Timer
 from textual.widgets import Input, RichLog, Static
 
+# Characters that need /bin/sh to interpret them
+_SHELL_CHARS = frozenset("|&;<>()$`*?[]{}~#\n")
+# /bin/sh builtins that also exist on PATH but behave differently there
+_SHELL_BUILTINS = frozenset(
+    ["echo", "printf", "test", "[", "kill", "pwd", "true", "false"]
+)
+
+
+def _split_simple_command(command: str) -> Optional[list[str]]:
+    """Split `command` into argv, or return None if it needs a shell."""
+    if any(char in _SHELL_CHARS for char in command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    # Leading VAR=value assignments are shell syntax too
+    if not argv or "=" in argv[0] or argv[0] in _SHELL_BUILTINS:
+        return None
+    return argv
+
 
 class TerminalPanel(Static):
     """
     A simple terminal panel that runs shell commands and supports interactive processes.
     """
 
-    DEFAULT_CSS = """
-    TerminalPanel {
-        height: 100%;
-        width: 100%;
-        background: $surface;
-        border: solid grey;
-        layout: vertical;
-    }
-    
-    TerminalPanel:focus-within {
-        border: solid white;
-    }
-    
-    RichLog {
-        height: 1fr;
-        border-top: solid grey;
-        overflow-y: scroll;
-        background: $surface-darken-1;
-        scrollbar-size: 1 1;
-    }
-
-    Input {
-        dock: bottom;
-        margin: 0;
-        border: none;
-        padding: 0 1;
-    }
-    """
-
-    def __init__(self, **kwargs):
+    def __init__(self, max_log_lines: int = 5000, **kwargs):
         super().__init__(**kwargs)
+        # Oldest log lines are dropped beyond this many
+        self._max_log_lines = max_log_lines
         self.process: Optional[asyncio.subprocess.Process] = None
+        # Reads output and reports the exit status of the running process
+        self._exit_task: Optional[asyncio.Task[None]] = None
         # Start in current working directory
         self.cwd = os.getcwd()
-        self.history = []
+        self._prompt = self._make_prompt()
+        self.history: deque[str] = deque(maxlen=1000)
         self.history_index = -1
         self.can_focus = True
+        # Lines waiting to be written to the log in the next batch; while the
+        # panel is hidden this is the backlog, capped like the log itself
+        self._pending_log: deque[Text] = deque(maxlen=max_log_lines)
+        self._flush_timer: Optional[Timer] = None
+        # Flush early once a batch reaches this many lines
+        self._log_batch_lines = 64
+        # Bytes requested per read from a subprocess pipe
+        self._read_chunk = 65536
+        # Pipe capacity requested for stdout/stderr (Linux only)
+        self._pipe_size = 1 << 20
+        self.refresh_env()
+        # Commands handled by the panel itself rather than a subprocess
+        self._builtins: dict[str, Callable[[str], Awaitable[None]]] = {
+            "exit": self._builtin_exit,
+            "cd": self._builtin_cd,
+        }
+
+    def refresh_env(self) -> None:
+        """Snapshot os.environ for the commands this panel runs."""
+        # Ensure unbuffered output for Python scripts
+        self._child_env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+
+    async def on_unmount(self) -> None:
+        """Stop any running command so it doesn't outlive the panel."""
+        if self._exit_task is not None:
+            self._exit_task.cancel()
+
+        process = self.process
+        if process is None or process.returncode is not None:
+            return
+
+        # The child leads its own session, so its pid is the group id
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+
+        # Give it a moment to exit cleanly before forcing it
+        try:
+            await asyncio.wait_for(process.wait(), timeout=0.5)
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await process.wait()
+
+    def on_show(self) -> None:
+        """Write out anything that arrived while the panel was hidden."""
+        self._flush_log()
 
     def on_focus(self) -> None:
         """When the panel gets focus, transfer it to the input."""
-        self.query_one("#cmd-input", Input).focus()
+        self._input_widget.focus()
 
     def on_click(self) -> None:
         """When the panel is clicked, focus the input."""
-        self.query_one("#cmd-input", Input).focus()
+        self._input_widget.focus()
 
     def compose(self) -> ComposeResult:
-        log = RichLog(id="terminal-log", wrap=True, highlight=True, markup=True)
-        log.can_focus = False  # Prevent log from stealing focus on click
-        yield log
-        yield Input(
+        # Keep references so hot paths don't have to query the DOM
+        # Output is written as Text; markup is parsed by write_markup() and
+        # raw shell output isn't worth a highlighter pass per line
+        self._log_widget = RichLog(
+            id="terminal-log",
+            max_lines=self._max_log_lines,
+            wrap=True,
+            highlight=False,
+            markup=False,
+        )
+        self._log_widget.can_focus = False  # Prevent log from stealing focus on click
+        yield self._log_widget
+        self._input_widget = Input(
             placeholder="Type a command...",
             id="cmd-input",
         )
+        yield self._input_widget
 
     def on_mount(self) -> None:
-        self.write_log(f"[bold blue]Welcome to the Terminal Panel![/]")
-        self.write_log(f"[dim]Current directory: {self.cwd}[/]")
-        self.write_log(
+        self.write_markup(f"[bold blue]Welcome to the Terminal Panel![/]")
+        self.write_markup(f"[dim]Current directory: {escape(self.cwd)}[/]")
+        self.write_markup(
             "[dim]Type 'exit' to clear history or 'cd <path>' to change directory.[/]"
         )
         self.focus_input()
 
+    def _make_prompt(self) -> str:
+        """Return the prompt markup for the current directory."""
+        return f"[bold green]{escape(os.path.basename(self.cwd) or '/')} $[/]"
+
     def focus_input(self) -> None:
-        self.query_one("#cmd-input", Input).focus()
+        self._input_widget.focus()
 
     @on(Input.Submitted, "#cmd-input")
     async def on_command_submit(self, event: Input.Submitted) -> None:
         command = event.value
-        # If we have a running process, send input to it
-        if self.process and self.process.returncode is None:
+        # Until the running command's output is drained and its exit reported,
+        # send input to it rather than starting another command
+        if self.process is not None:
             # Echo input to local terminal
-            self.write_log(f"{command}")
+            self.write_log(Text(command))
 
             if self.process.stdin:
                 try:
-                    # Write input + newline to process stdin
-                    self.process.stdin.write(f"{command}\n".encode("utf-8"))
+                    # Write input + newline to process stdin; both land in the
+                    # transport buffer before the single drain below
+                    self.process.stdin.write(command.encode("utf-8"))
+                    self.process.stdin.write(b"\n")
                     await self.process.stdin.drain()
-                except Exception as e:
-                    self.write_log(f"[red]Error writing to process: {e}[/]")
+                except ConnectionError as e:
+                    self.write_markup(
+                        f"[red]Error writing to process: {escape(str(e))}[/]"
+                    )
 
             event.input.value = ""
             return
@@ -108,111 +182,225 @@ class TerminalPanel(Static):
         self.history_index = len(self.history)
 
         # Display command in log with prompt style
-        prompt = f"[bold green]{os.path.basename(self.cwd) or '/'} $[/]"
-        self.write_log(f"{prompt} {command}")
+        self.write_markup(f"{self._prompt} {escape(command)}")
 
         event.input.value = ""  # Clear input
 
         # Handle built-in commands
-        if command == "exit":
-            self.query_one("#terminal-log", RichLog).clear()
+        name, _, args = command.partition(" ")
+        builtin = self._builtins.get(name)
+        if builtin:
+            await builtin(args)
             return
 
-        if command.startswith("cd "):
-            try:
-                parts = shlex.split(command)
-                if len(parts) > 1:
-                    new_dir = os.path.expanduser(parts[1])
-                    # Handle relative paths
-                    if not os.path.isabs(new_dir):
-                        new_dir = os.path.join(self.cwd, new_dir)
-
-                    # Normalize path
-                    new_dir = os.path.normpath(new_dir)
-
-                    if os.path.isdir(new_dir):
-                        self.cwd = new_dir
-                    else:
-                        self.write_log(
-                            f"[red]cd: no such file or directory: {parts[1]}[/]"
-                        )
-                else:
-                    # cd without args goes to home
-                    self.cwd = os.path.expanduser("~")
-            except Exception as e:
-                self.write_log(f"[red]Error changing directory: {e}[/]")
+        # Run external command; a running process gets the next submits as
+        # input, so only one command runs at a time
+        await self.run_command(command)
+
+    async def _builtin_exit(self, args: str) -> None:
+        if args:
+            # Only a bare 'exit' clears the log; 'exit 1' runs in sh as before
+            # and reports its exit code
+            await self.run_command(f"exit {args}")
             return
+        self._pending_log.clear()
+        self._log_widget.clear()
 
-        # Run external command
-        self.run_command(command)
+    async def _builtin_cd(self, args: str) -> None:
+        try:
+            target = args.strip()
+            # Only tokenize when the path is quoted or escaped
+            if any(char in target for char in ("'", '"', "\\")):
+                parts = shlex.split(target)
+                target = parts[0] if parts else ""
+
+            if target:
+                new_dir = os.path.expanduser(target)
+                # Handle relative paths
+                if not os.path.isabs(new_dir):
+                    new_dir = os.path.join(self.cwd, new_dir)
+
+                # Normalize path
+                new_dir = os.path.normpath(new_dir)
+
+                # isdir can block for a long time on slow or network mounts
+                if await asyncio.to_thread(os.path.isdir, new_dir):
+                    self.cwd = new_dir
+                else:
+                    self.write_markup(
+                        f"[red]cd: no such file or directory: {escape(target)}[/]"
+                    )
+            else:
+                # cd without args goes to home
+                self.cwd = os.path.expanduser("~")
+        except ValueError as e:
+            self.write_markup(f"[red]Error changing directory: {escape(str(e))}[/]")
+        self._prompt = self._make_prompt()
+        self._flush_log()
 
-    @work(exclusive=True)
     async def run_command(self, command: str) -> None:
+        """Start `command` and hand it off to a task that waits for it to exit."""
         try:
-            # Prepare environment
-            env = os.environ.copy()
-            # Ensure unbuffered output for Python scripts
-            env["PYTHONUNBUFFERED"] = "1"
-
-            # Start the subprocess with pipes for all streams
-            # using create_subprocess_shell allows us to run 'command' as typed
-            self.process = await asyncio.create_subprocess_shell(
-                command,
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=self.cwd,
-                env=env,
-            )
-
-            # Read stdout and stderr concurrently
-            tasks = []
-            if self.process.stdout:
-                tasks.append(
-                    asyncio.create_task(
-                        self._read_stream(self.process.stdout, "stdout")
-                    )
-                )
-            if self.process.stderr:
-                tasks.append(
-                    asyncio.create_task(
-                        self._read_stream(self.process.stderr, "stderr")
-                    )
-                )
+            self.process = await self._spawn(command)
+        except Exception as e:
+            self.write_markup(f"[red]Error executing command: {escape(str(e))}[/]")
+            self._flush_log()
+            return
 
-            # Wait for process to finish
-            await self.process.wait()
+        self._enlarge_pipes(self.process)
+        self._exit_task = asyncio.create_task(self._await_exit(self.process))
 
-            # Ensure all output is read
-            if tasks:
-                await asyncio.gather(*tasks)
+    async def _await_exit(self, process: asyncio.subprocess.Process) -> None:
+        try:
+            # Drain stdout and stderr, then collect the exit status
+            await self._read_output(process)
+            await process.wait()
 
-            if self.process.returncode != 0:
-                self.write_log(f"[bold red]Exit code: {self.process.returncode}[/]")
+            if process.returncode != 0:
+                self.write_markup(f"[bold red]Exit code: {process.returncode}[/]")
 
         except Exception as e:
-            self.write_log(f"[red]Error executing command: {e}[/]")
+            self.write_markup(f"[red]Error executing command: {escape(str(e))}[/]")
         finally:
-            self.process = None
-
-    async def _read_stream(
-        self, stream: asyncio.StreamReader, stream_name: str
-    ) -> None:
-        while True:
+            # A later command may already have replaced these
+            if self.process is process:
+                self.process = None
+            if self._exit_task is asyncio.current_task():
+                self._exit_task = None
+
+        # Show the tail of the output now rather than on the next timer tick
+        self._flush_log()
+
+    async def _spawn(self, command: str) -> asyncio.subprocess.Process:
+        """Start `command` with pipes for all streams, via /bin/sh only if needed."""
+        options: dict[str, Any] = {
+            "stdin": asyncio.subprocess.PIPE,
+            "stdout": asyncio.subprocess.PIPE,
+            "stderr": asyncio.subprocess.PIPE,
+            "cwd": self.cwd,
+            "env": self._child_env,
+            # Own process group so teardown can signal the whole pipeline
+            "start_new_session": True,
+        }
+
+        argv = _split_simple_command(command)
+        if argv:
             try:
-                # Read line by line for smoother output updates
-                line = await stream.readline()
-                if not line:
-                    break
-
-                decoded_line = line.decode("utf-8", errors="replace").rstrip()
-                if decoded_line:
-                    style = "" if stream_name == "stdout" else "[red]"
-                    end_style = "" if stream_name == "stdout" else "[/]"
-                    self.write_log(f"{style}{decoded_line}{end_style}")
-            except Exception:
-                break
-
-    def write_log(self, message: str) -> None:
-        log = self.query_one("#terminal-log", RichLog)
-        log.write(message)
+                return await asyncio.create_subprocess_exec(*argv, **options)
+            except OSError:
+                # Missing, not executable or a directory; let the shell run
+                # it (e.g. a builtin) or report it with its usual exit status
+                pass
+
+        # using create_subprocess_shell allows us to run 'command' as typed
+        return await asyncio.create_subprocess_shell(command, **options)
+
+    def _enlarge_pipes(self, process: asyncio.subprocess.Process) -> None:
+        """Grow the stdout/stderr pipes so chatty commands block less on write."""
+        if not sys.platform.startswith("linux"):
+            return
+        # asyncio has no public accessor for a Process's transport
+        transport = getattr(process, "_transport", None)
+        if transport is None:
+            return
+        for fd in (1, 2):
+            pipe_transport = transport.get_pipe_transport(fd)
+            if pipe_transport is None:
+                continue
+            pipe = pipe_transport.get_extra_info("pipe")
+            try:
+                fcntl.fcntl(pipe.fileno(), fcntl.F_SETPIPE_SZ, self._pipe_size)
+            except ValueError:
+                # Pipe already closed; the command exited before we got here
+                pass
+            except OSError:
+                # Above /proc/sys/fs/pipe-max-size; keep the default size
+                pass
+
+    async def _read_output(self, process: asyncio.subprocess.Process) -> None:
+        """Read stdout and stderr from one loop until both reach EOF."""
+        # One large read in flight per stream; lines are split out locally
+        # rather than waking up once per line with readline()
+        reads: dict[asyncio.Future[bytes], tuple[asyncio.StreamReader, str]] = {}
+        # Decoders carry multibyte characters split across reads; pending
+        # holds the pieces of the unterminated last line of each stream, so a
+        # long line is joined once rather than re-copied on every read
+        decoders: dict[str, codecs.IncrementalDecoder] = {}
+        pending: dict[str, list[str]] = {}
+        for stream, stream_name in (
+            (process.stdout, "stdout"),
+            (process.stderr, "stderr"),
+        ):
+            if stream:
+                read = asyncio.ensure_future(stream.read(self._read_chunk))
+                reads[read] = (stream, stream_name)
+                decoders[stream_name] = codecs.getincrementaldecoder("utf-8")(
+                    errors="replace"
+                )
+                pending[stream_name] = []
+
+        try:
+            while reads:
+                done, _ = await asyncio.wait(reads, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    stream, stream_name = reads.pop(finished)
+                    data = finished.result()
+                    decoder = decoders[stream_name]
+                    if not data:
+                        # Output that didn't end with a newline
+                        parts = pending[stream_name]
+                        parts.append(decoder.decode(b"", final=True))
+                        text = "".join(parts)
+                        if text:
+                            self._write_output_line(text, stream_name)
+                        continue
+
+                    # Only the new chunk is split; the partial line before it
+                    # is joined once its newline arrives
+                    first, *lines = decoder.decode(data).split("\n")
+                    parts = pending[stream_name]
+                    parts.append(first)
+                    if lines:
+                        *lines, last = lines
+                        self._write_output_line("".join(parts), stream_name)
+                        for line in lines:
+                            self._write_output_line(line, stream_name)
+                        pending[stream_name] = [last]
+
+                    read = asyncio.ensure_future(stream.read(self._read_chunk))
+                    reads[read] = (stream, stream_name)
+        finally:
+            # Don't leave reads behind if on_unmount cancels the exit task
+            for unfinished in reads:
+                unfinished.cancel()
+
+    def _write_output_line(self, line: str, stream_name: str) -> None:
+        line = line.rstrip("\r\n")
+        if line:
+            # Output is plain text; only stderr gets a style
+            style = "" if stream_name == "stdout" else "red"
+            self.write_log(Text(line, style=style))
+
+    def write_markup(self, message: str) -> None:
+        """Write a panel message that uses Rich markup."""
+        self.write_log(Text.from_markup(message))
+
+    def write_log(self, message: Text) -> None:
+        # Coalesce bursts of output into a single log write per refresh
+        self._pending_log.append(message)
+        if not self.display:
+            # Nothing to render while hidden; on_show writes the backlog
+            return
+        if len(self._pending_log) >= self._log_batch_lines:
+            self._flush_log()
+        elif self._flush_timer is None:
+            self._flush_timer = self.set_timer(0.016, self._flush_log)
+
+    def _flush_log(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.stop()
+            self._flush_timer = None
+        if not self._pending_log or not self.display:
+            return
+        self._log_widget.write(Text("\n").join(self._pending_log))
+        self._pending_log.clear()